@@ -32,6 +32,7 @@ app = Client(
     api_id=Config.API_ID,
     api_hash=Config.API_HASH,
     bot_token=Config.BOT_TOKEN,
+    max_concurrent_transmissions=4,  # overlap profile-photo downloads across concurrent /start
 )
 
 OWNER_ID = Config.OWNER_ID
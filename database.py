@@ -1,16 +1,48 @@
 # database.py
 
 import sqlite3
+import atexit
 from config import Config
 from datetime import datetime
 import os
 
 DEFAULT_WAIFU_IMAGE = "assetsphoto_2025-08-29_13-53-48.jpg"
 
+_read_connections = {}
+
+
+def get_read_connection(db_path=Config.DB_PATH):
+    """
+    Shared read-only connection for handlers that never write (search, animesearch, card PM).
+    Under WAL it never blocks the writer and keeps its own warm page cache.
+    The database file must already exist (create a Database() first).
+    """
+    conn = _read_connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA query_only=1")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        _read_connections[db_path] = conn
+    return conn
+
+
+# Shared by the read-only handlers; meant for asyncio.to_thread. conn.execute gives
+# each call its own cursor, so concurrent worker threads never share one.
+def read_all(sql, params=(), db_path=Config.DB_PATH):
+    return get_read_connection(db_path).execute(sql, params).fetchall()
+
+
+def read_one(sql, params=(), db_path=Config.DB_PATH):
+    return get_read_connection(db_path).execute(sql, params).fetchone()
+
+
 class Database:
     def __init__(self, db_path=Config.DB_PATH):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
         self.cursor = self.conn.cursor()
+        self.tune_connection()
+        atexit.register(self.close)
         self.setup()
         self.setup_profile_tables()
         self.setup_additional_tables()
@@ -18,6 +50,15 @@ class Database:
         self.ensure_default_waifu_image()
 
     # ---------------- Setup ----------------
+    def tune_connection(self):
+        """WAL so readers don't wait on writers, fewer fsyncs, bigger in-memory caches"""
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
+        self.cursor.execute("PRAGMA temp_store=MEMORY")
+        self.cursor.execute("PRAGMA cache_size=-65536")
+        self.cursor.execute("PRAGMA mmap_size=268435456")
+        self.cursor.execute("PRAGMA busy_timeout=5000")
+
     def setup(self):
         """Create users, groups, logs tables and ensure columns exist"""
         self.cursor.execute("""
@@ -92,6 +133,8 @@ class Database:
                 PRIMARY KEY (user_id, waifu_id)
             )
         """)
+        # Per-waifu lookups (top collectors) can't use the (user_id, waifu_id) key
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_uw_waifu_amount ON user_waifus(waifu_id, amount)")
         self.conn.commit()
 
     # ---------------- User Management ----------------
@@ -239,6 +282,9 @@ class Database:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # Expression indexes so the LOWER(media_type) = 'video' lookups (reward) can seek
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_wc_rarity_mt ON waifu_cards(rarity, lower(media_type))")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_wc_mt ON waifu_cards(lower(media_type))")
         self.conn.commit()
 
     def ensure_default_waifu_image(self):
@@ -250,4 +296,9 @@ class Database:
 
     # ---------------- Close ----------------
     def close(self):
+        """Refresh planner stats, then close (also runs at interpreter exit)"""
+        try:
+            self.conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
         self.conn.close()
@@ -10,215 +10,165 @@ DB_PATH = getattr(Config, "DB_PATH", "waifu_bot.db")
 # In-memory processing guard to avoid re-entrancy for same user (per process)
 PROCESSING = set()
 
+# Whether any Cinematic Legend video exists (usually none); rechecked periodically
+# so cards added by admins are picked up without a restart
+CINEMATIC_RECHECK_SECS = 300
+HAS_CINEMATIC_LEGEND_VIDEO = None
+_cinematic_checked_at = 0.0
+
+# Shared connection for this module. Each helper below runs start-to-finish without
+# awaiting, so transactions on it never interleave between handlers.
+conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=5)
+conn.execute("PRAGMA cache_size=-64000")
+conn.execute("PRAGMA mmap_size=268435456")
+
+
+def _has_unique_key(table, cols, skip=None):
+    """True if some full (non-partial) unique index or primary key on table covers exactly cols."""
+    want = {c.lower() for c in cols}
+    for _, name, unique, _, partial in conn.execute(f"PRAGMA index_list('{table}')").fetchall():
+        if not unique or partial or name == skip:
+            continue
+        got = {str(r[2]).lower() for r in conn.execute(f"PRAGMA index_info('{name}')").fetchall()}
+        if got == want:
+            return True
+    return False
+
+
 # Ensure user_claims table exists and has waifu_id column
 def ensure_user_claims_table():
-    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS user_claims (
                 user_id INTEGER PRIMARY KEY,
                 last_claim INTEGER,
                 waifu_id INTEGER
             )
         """)
-        conn.commit()
-
         # Ensure waifu_id column exists (older DBs might not have it)
-        cur.execute("PRAGMA table_info(user_claims)")
-        cols = [r[1] for r in cur.fetchall()]
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(user_claims)").fetchall()]
         if "waifu_id" not in cols:
-            try:
-                cur.execute("ALTER TABLE user_claims ADD COLUMN waifu_id INTEGER")
-                conn.commit()
-            except Exception:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-    except Exception:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
+            conn.execute("ALTER TABLE user_claims ADD COLUMN waifu_id INTEGER")
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ reward: failed to prepare user_claims: {e}")
+
+    # The inventory UPSERT needs a unique (user_id, waifu_id). database.py declares it as
+    # the primary key, but collect.py/give.py can create user_waifus with only an
+    # AUTOINCREMENT id; only then add our own index (a second copy of the primary key
+    # would just be one more B-tree to write). Separate try: duplicate rows make it fail.
+    global UW_HAS_UNIQUE
+    try:
+        if _has_unique_key("user_waifus", ("user_id", "waifu_id"), skip="idx_uw_user_waifu"):
+            conn.execute("DROP INDEX IF EXISTS idx_uw_user_waifu")
+        else:
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_uw_user_waifu ON user_waifus(user_id, waifu_id)")
+        conn.commit()
+        UW_HAS_UNIQUE = True
+    except sqlite3.Error as e:
+        conn.rollback()
+        UW_HAS_UNIQUE = False
+        print(f"❌ reward: no unique (user_id, waifu_id) on user_waifus, using update-then-insert: {e}")
 
+UW_HAS_UNIQUE = False
 ensure_user_claims_table()
 
 
-def add_waifu_to_inventory(user_id: int, waifu_id: int):
-    """Insert or update user_waifus with given waifu_id"""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-
+def add_waifu_to_inventory(cur, user_id: int, waifu_id: int):
+    """Insert or update user_waifus with given waifu_id (caller owns the transaction)"""
+    if not UW_HAS_UNIQUE:
         cur.execute("""
             UPDATE user_waifus
                SET amount = amount + 1,
                    last_collected = strftime('%s','now')
              WHERE user_id = ? AND waifu_id = ?
         """, (user_id, waifu_id))
-
         if cur.rowcount == 0:
             cur.execute("""
                 INSERT INTO user_waifus (user_id, waifu_id, amount, last_collected)
                 VALUES (?, ?, 1, strftime('%s','now'))
             """, (user_id, waifu_id))
+        return
 
-        conn.commit()
-    except Exception:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
+    cur.execute("""
+        INSERT INTO user_waifus (user_id, waifu_id, amount, last_collected)
+        VALUES (?, ?, 1, strftime('%s','now'))
+        ON CONFLICT(user_id, waifu_id) DO UPDATE SET amount = amount + 1, last_collected = excluded.last_collected
+    """, (user_id, waifu_id))
 
 
-async def reserve_claim(user_id: int, retries: int = 5, backoff: float = 0.15) -> bool:
+async def grant_reward(user_id: int, waifu_id: int, retries: int = 5, backoff: float = 0.15) -> bool:
     """
-    Atomically reserve the user's claim if not already claimed.
-    Returns True if reservation succeeded (user did NOT have a claim before).
-    Returns False if user already had a claim or reservation failed.
-    Uses INSERT ... SELECT WHERE NOT EXISTS(...) to be atomic.
+    Atomically record the user's claim (with its waifu_id) and add the waifu
+    to their inventory in a single transaction.
+    Returns True if the reward was granted (user did NOT have a claim before).
+    Returns False if user already had a claim or the write failed.
     """
-    attempt = 0
-    while attempt < retries:
-        conn = None
+    for _ in range(retries):
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=5)
             cur = conn.cursor()
-            # Atomic insert-if-not-exists
             cur.execute("BEGIN IMMEDIATE")
-            cur.execute("""
-                INSERT INTO user_claims (user_id, last_claim)
-                SELECT ?, ?
-                WHERE NOT EXISTS (SELECT 1 FROM user_claims WHERE user_id = ?)
-            """, (user_id, int(time.time()), user_id))
-            inserted = cur.rowcount  # 1 if inserted, 0 if already existed
+            cur.execute(
+                "INSERT OR IGNORE INTO user_claims (user_id, last_claim, waifu_id) VALUES (?, ?, ?)",
+                (user_id, int(time.time()), waifu_id)
+            )
+            if cur.rowcount == 0:
+                # already claimed: nothing to write
+                conn.rollback()
+                return False
+            add_waifu_to_inventory(cur, user_id, waifu_id)
             conn.commit()
-            return inserted == 1
+            return True
         except sqlite3.OperationalError as e:
             # might be "database is locked" transiently — wait and retry
-            try:
-                if conn:
-                    conn.rollback()
-            except Exception:
-                pass
-            attempt += 1
+            conn.rollback()
+            print(f"⚠️ reward: grant for {user_id} failed, retrying: {e}")
             await asyncio.sleep(backoff)
             backoff *= 1.5
-            continue
-        except Exception:
-            try:
-                if conn:
-                    conn.rollback()
-            except Exception:
-                pass
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"❌ reward: grant for {user_id} failed: {e}")
             return False
-        finally:
-            try:
-                if conn:
-                    conn.close()
-            except Exception:
-                pass
     return False
 
 
-def attach_waifu_to_claim(user_id: int, waifu_id: int):
-    """Store the assigned waifu_id into the user's claim row (best-effort)."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("UPDATE user_claims SET waifu_id = ? WHERE user_id = ?", (waifu_id, user_id))
-        conn.commit()
-    except Exception:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
-
-
-def rollback_claim(user_id: int):
-    """Delete claim row (used when we reserved but failed to give reward)."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM user_claims WHERE user_id = ?", (user_id,))
-        conn.commit()
-    except Exception:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
-
-
 async def pick_reward_video():
     """
     Pick a waifu video id from DB.
     Returns (waifu_id, name, anime, theme, media_file) or None.
     """
-    conn = None
+    global HAS_CINEMATIC_LEGEND_VIDEO, _cinematic_checked_at
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
+        now = time.time()
+        if HAS_CINEMATIC_LEGEND_VIDEO is None or now - _cinematic_checked_at > CINEMATIC_RECHECK_SECS:
+            HAS_CINEMATIC_LEGEND_VIDEO = conn.execute("""
+                SELECT 1 FROM waifu_cards
+                 WHERE rarity = 'Cinematic Legend' AND LOWER(media_type) = 'video'
+                 LIMIT 1
+            """).fetchone() is not None
+            _cinematic_checked_at = now
 
         # Prefer Cinematic Legend video
-        cur.execute("""
-            SELECT id, name, anime, event, media_file
-              FROM waifu_cards
-             WHERE rarity = 'Cinematic Legend' AND LOWER(media_type) = 'video'
-             ORDER BY RANDOM() LIMIT 1
-        """)
-        r = cur.fetchone()
-        if r:
-            return r
-
-        cur.execute("""
+        if HAS_CINEMATIC_LEGEND_VIDEO:
+            r = conn.execute("""
+                SELECT id, name, anime, event, media_file
+                  FROM waifu_cards
+                 WHERE rarity = 'Cinematic Legend' AND LOWER(media_type) = 'video'
+                 ORDER BY RANDOM() LIMIT 1
+            """).fetchone()
+            if r:
+                return r
+
+        return conn.execute("""
             SELECT id, name, anime, event, media_file
               FROM waifu_cards
              WHERE LOWER(media_type) = 'video'
              ORDER BY RANDOM() LIMIT 1
-        """)
-        r = cur.fetchone()
-        return r
-    except Exception:
+        """).fetchone()
+    except sqlite3.Error as e:
+        print(f"❌ reward: failed to pick video: {e}")
         return None
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
 
 
 @app.on_message(filters.command("reward"))
@@ -237,27 +187,19 @@ async def reward_command(client, message):
 
     PROCESSING.add(user_id)
     try:
-        # Attempt atomic reservation
-        reserved = await reserve_claim(user_id)
-        if not reserved:
-            await message.reply_text("❌ You have already claimed your special reward!")
-            return
-
-        # We have a reservation; pick a waifu video to give
+        # Pick a waifu video to give
         row = await pick_reward_video()
         if not row:
-            # No video available: rollback claim so user can try later
-            rollback_claim(user_id)
             await message.reply_text("❌ No video cards available in the database. Try again later.")
             return
 
         waifu_id, name, anime, theme, media_file = row
 
-        # Attach waifu_id to claim record (so any concurrent attempt sees assigned id)
-        attach_waifu_to_claim(user_id, waifu_id)
-
-        # Add to inventory (idempotent enough)
-        add_waifu_to_inventory(user_id, waifu_id)
+        # Claim row + inventory in one transaction
+        granted = await grant_reward(user_id, waifu_id)
+        if not granted:
+            await message.reply_text("❌ You have already claimed your special reward!")
+            return
 
         caption = (
             "🎉 You received a special reward!\n\n"
@@ -298,26 +240,12 @@ async def allow_again_command(client, message):
         await message.reply_text("❌ Only the bot owner can use this command.")
         return
 
-    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM user_claims")
+        conn.execute("DELETE FROM user_claims")
         conn.commit()
-        await message.reply_text("✅ All user reward claims have been reset. Everyone can claim /reward again.")
-    except Exception:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
-        try:
-            await message.reply_text("❌ Failed to reset claims. Check logs.")
-        except Exception:
-            pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
\ No newline at end of file
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ reward: failed to reset claims: {e}")
+        await message.reply_text("❌ Failed to reset claims. Check logs.")
+        return
+    await message.reply_text("✅ All user reward claims have been reset. Everyone can claim /reward again.")
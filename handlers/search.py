@@ -1,10 +1,19 @@
 # handlers/search.py
+import asyncio
 from main import app
 from pyrogram import filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from database import Database
+from database import Database, get_read_connection, read_all, read_one
 
 db = Database()
+read_db = get_read_connection()
+
+
+CARD_BY_ID_SQL = """
+    SELECT id, name, anime, rarity, event, media_type, media_file, media_file_id
+    FROM waifu_cards
+    WHERE id = ?
+"""
 
 
 def format_user_label(user_row):
@@ -19,6 +28,28 @@ def format_user_label(user_row):
     return str(user_id)
 
 
+def _top_collectors(wid, limit=5):
+    """
+    Return [(user_id, amount, username, first_name), ...] for the top holders of a waifu.
+    Two index-backed queries (user_waifus by waifu_id, then users by PK) instead of a LEFT JOIN.
+    """
+    rows = read_db.execute(
+        "SELECT user_id, amount FROM user_waifus WHERE waifu_id = ? ORDER BY amount DESC LIMIT ?",
+        (wid, limit)
+    ).fetchall()
+    if not rows:
+        return []
+    ids = [uid for uid, _ in rows]
+    names = {
+        uid: (uname, fname)
+        for uid, uname, fname in read_db.execute(
+            f"SELECT user_id, username, first_name FROM users WHERE user_id IN ({','.join('?' * len(ids))})",
+            ids
+        )
+    }
+    return [(uid, amount) + names.get(uid, (None, None)) for uid, amount in rows]
+
+
 async def send_waifu_details(client, chat_id, waifu_row):
     """
     waifu_row is a tuple:
@@ -27,15 +58,7 @@ async def send_waifu_details(client, chat_id, waifu_row):
     (wid, name, anime, rarity, event, media_type, media_file, media_file_id) = waifu_row
 
     # Top 5 collectors for this waifu
-    db.cursor.execute("""
-        SELECT uw.user_id, uw.amount, u.username, u.first_name
-        FROM user_waifus uw
-        LEFT JOIN users u ON uw.user_id = u.user_id
-        WHERE uw.waifu_id = ?
-        ORDER BY uw.amount DESC
-        LIMIT 5
-    """, (wid,))
-    collectors = db.cursor.fetchall()
+    collectors = await asyncio.to_thread(_top_collectors, wid)
 
     collectors_lines = []
     if collectors:
@@ -89,27 +112,33 @@ async def search_handler(client, message):
     query = parts[1].strip()
     like = f"%{query}%"
 
-    # Find matching waifu cards (case-insensitive)
-    db.cursor.execute("""
-        SELECT id, name, anime, rarity, event, media_type, media_file, media_file_id
-        FROM waifu_cards
-        WHERE name LIKE ? COLLATE NOCASE
-        LIMIT 50
+    # Probe for matching ids first (case-insensitive); most searches hit a single card
+    ids = await asyncio.to_thread(read_all, """
+        SELECT id FROM waifu_cards WHERE name LIKE ? COLLATE NOCASE LIMIT 2
     """, (like,))
-    rows = db.cursor.fetchall()
 
-    if not rows:
+    if not ids:
         return await message.reply_text(f"No waifu found matching `{query}`.", quote=True)
 
-    if len(rows) == 1:
-        # only one result — show it directly
-        await send_waifu_details(client, message.chat.id, rows[0])
+    if len(ids) == 1:
+        # only one result — fetch the full row and show it directly
+        row = await asyncio.to_thread(read_one, CARD_BY_ID_SQL, (ids[0][0],))
+        if row:
+            await send_waifu_details(client, message.chat.id, row)
         return
 
+    # Picker only needs id + name
+    rows = await asyncio.to_thread(read_all, """
+        SELECT id, name
+        FROM waifu_cards
+        WHERE name LIKE ? COLLATE NOCASE
+        LIMIT 50
+    """, (like,))
+
     # multiple results — show list with buttons to pick the correct waifu
     buttons = []
     for r in rows[:10]:  # show up to 10 matches inline
-        wid, name, *_ = r
+        wid, name = r
         label = f"{name} (ID:{wid})"
         buttons.append([InlineKeyboardButton(label[:40], callback_data=f"search_select:{wid}")])
 
@@ -120,20 +149,18 @@ async def search_handler(client, message):
     await message.reply_text("\n".join(preview_lines), reply_markup=InlineKeyboardMarkup(buttons), quote=True)
 
 
+SELECT_PREFIX_LEN = len("search_select:")
+
+
 @app.on_callback_query(filters.regex(r"^search_select:"))
 async def search_select_cb(client, callback):
     try:
-        wid = int(callback.data.split(":")[1])
+        wid = int(callback.data[SELECT_PREFIX_LEN:])
     except Exception:
         await callback.answer("Invalid selection.", show_alert=True)
         return
 
-    db.cursor.execute("""
-        SELECT id, name, anime, rarity, event, media_type, media_file, media_file_id
-        FROM waifu_cards
-        WHERE id = ?
-    """, (wid,))
-    row = db.cursor.fetchone()
+    row = await asyncio.to_thread(read_one, CARD_BY_ID_SQL, (wid,))
     if not row:
         await callback.answer("Waifu not found.", show_alert=True)
         return
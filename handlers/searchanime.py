@@ -6,15 +6,20 @@ Displays A-Z inline keyboard. Clicking a letter shows all anime names
 found in your waifu_cards.anime column that start with that letter.
 """
 
+import asyncio
 from pyrogram import filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from config import app
-from database import Database
+from database import Database, read_all
 
 db = Database()
 
 ALPHABET = [chr(c) for c in range(ord("A"), ord("Z") + 1)]
 
+# Limit result display to 50 for readability; "1. ".."50. " prefixes built once
+MAX_DISPLAY = 50
+IDX_PREFIX = [f"{i}. " for i in range(1, MAX_DISPLAY + 1)]
+
 # Build alphabet keyboard in compact rows
 def alphabet_keyboard():
     buttons = []
@@ -45,7 +50,37 @@ async def animesearch_cmd(client, message):
     await message.reply_text(text, reply_markup=alphabet_keyboard())
 
 
-@app.on_callback_query(filters.regex(r"^animesearch:(?P<action>.+)$"))
+CB_PREFIX = "animesearch:"
+CB_PREFIX_LEN = len(CB_PREFIX)
+
+
+async def _close(client, callback: CallbackQuery):
+    try:
+        await callback.message.delete()
+    except Exception:
+        pass
+    await callback.answer()
+
+
+async def _back(client, callback: CallbackQuery):
+    try:
+        await callback.message.edit_text(
+            "🔎 **Anime Search**\n\nTap a letter to list anime names starting with that character.",
+            reply_markup=alphabet_keyboard()
+        )
+    except Exception:
+        pass
+    await callback.answer()
+
+
+# Non-letter actions; anything else is treated as a letter
+DISPATCH = {
+    "close": _close,
+    "back": _back,
+}
+
+
+@app.on_callback_query(filters.regex(r"^animesearch:"))
 async def animesearch_callback(client, callback: CallbackQuery):
     """
     Handle:
@@ -53,27 +88,11 @@ async def animesearch_callback(client, callback: CallbackQuery):
       animesearch:back   -> show alphabet again
       animesearch:close  -> close (delete) the help message
     """
-    data = callback.data.split(":", 1)[1]
-
-    # Close message
-    if data == "close":
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass
-        await callback.answer()
-        return
+    data = callback.data[CB_PREFIX_LEN:]
 
-    # Back to alphabet
-    if data == "back":
-        try:
-            await callback.message.edit_text(
-                "🔎 **Anime Search**\n\nTap a letter to list anime names starting with that character.",
-                reply_markup=alphabet_keyboard()
-            )
-        except Exception:
-            pass
-        await callback.answer()
+    action = DISPATCH.get(data)
+    if action:
+        await action(client, callback)
         return
 
     # Letter selected (A-Z)
@@ -92,8 +111,7 @@ async def animesearch_callback(client, callback: CallbackQuery):
             LIMIT 100
         """
         like_pattern = f"{letter}%"
-        db.cursor.execute(query, (like_pattern,))
-        rows = db.cursor.fetchall()
+        rows = await asyncio.to_thread(read_all, query, (like_pattern,))
         anime_names = [r[0] for r in rows if r and r[0]]
     except Exception as e:
         # On DB error, inform the user (but don't crash)
@@ -105,16 +123,11 @@ async def animesearch_callback(client, callback: CallbackQuery):
         await callback.answer(f"No anime found starting with '{letter}'.", show_alert=True)
         return
 
-    # Format list (limit display to 50 for readability)
-    MAX_DISPLAY = 50
-    display_list = anime_names[:MAX_DISPLAY]
-    text_lines = [f"✨ Anime starting with '{letter}':\n"]
-    for idx, name in enumerate(display_list, start=1):
-        text_lines.append(f"{idx}. {name}")
+    # Format list
+    body = "\n".join(IDX_PREFIX[i] + str(name) for i, name in enumerate(anime_names[:MAX_DISPLAY]))
+    final_text = f"✨ Anime starting with '{letter}':\n\n{body}"
     if len(anime_names) > MAX_DISPLAY:
-        text_lines.append(f"\n...and {len(anime_names) - MAX_DISPLAY} more (truncated)")
-
-    final_text = "\n".join(text_lines)
+        final_text += f"\n\n...and {len(anime_names) - MAX_DISPLAY} more (truncated)"
 
     # Edit message to show results and Back/Close keyboard
     try:
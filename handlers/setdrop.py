@@ -1,12 +1,23 @@
 # handlers/setdrop.py
 
 import sqlite3
+import asyncio
+import random
+import time
+from array import array
 from pyrogram import filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config, app
+from database import get_read_connection
 
 DB_PATH = "waifu_bot.db"
+# check_same_thread=False: handlers run their queries in asyncio.to_thread workers.
+# Each query uses conn.execute (its own cursor) so concurrent workers don't share one.
 conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+conn.execute("PRAGMA journal_mode=WAL")
+conn.execute("PRAGMA synchronous=NORMAL")
+conn.execute("PRAGMA cache_size=-64000")
+conn.execute("PRAGMA mmap_size=268435456")  # serve waifu_cards pages from the mapping, no pread()
 cursor = conn.cursor()
 
 # Ensure current_drops table exists
@@ -19,8 +30,16 @@ CREATE TABLE IF NOT EXISTS current_drops (
 """)
 conn.commit()
 
-# In-memory drop counter
-drop_settings = {}  # {chat_id: {"target": int, "count": int}}
+# Read-only connection for the PM card lookup (start_with_card)
+read_db = get_read_connection(DB_PATH)
+
+# In-memory drop counters: chat_id -> slot in the flat TARGETS/COUNTS arrays
+CHAT_IDX = {}  # {chat_id: int}
+TARGETS = array("i")
+COUNTS = array("i")
+
+# Bot username for the PM deep link; get_me() never changes during a run, so resolve it once
+BOT_USERNAME = None
 
 # ---------------- Allowed rarities (human keywords, no emoji) ----------------
 # We'll match these with SQL LIKE to be robust against emoji/spacing differences in DB.
@@ -54,6 +73,132 @@ def like_params(keywords):
     return [f"%{k.strip()}%" for k in keywords]
 
 
+# ---------------- Eligible card pool ----------------
+# The allowed/blocked filter only depends on waifu_cards, so resolve it to a list of ids
+# once and pick from that per drop instead of re-running the LIKE scan every time.
+ELIGIBLE_REFRESH_SECS = 300  # pick up cards added/edited/deleted by admins
+ELIGIBLE_CARD_IDS = array("i")
+_eligible_loaded_at = 0.0
+
+
+def refresh_eligible_cards():
+    """Rebuild ELIGIBLE_CARD_IDS from the allowed/blocked rarity keywords."""
+    global ELIGIBLE_CARD_IDS, _eligible_loaded_at
+    allowed_clause = " OR ".join("rarity LIKE ?" for _ in ALLOWED_KEYWORDS)
+    blocked_clause = " OR ".join("rarity LIKE ?" for _ in BLOCKED_KEYWORDS)
+
+    # Try 1: cards matching allowed keywords and NOT matching blocked keywords
+    rows = conn.execute(
+        f"SELECT id FROM waifu_cards WHERE ({allowed_clause}) AND NOT ({blocked_clause})",
+        like_params(ALLOWED_KEYWORDS) + like_params(BLOCKED_KEYWORDS)
+    ).fetchall()
+    ids = [row[0] for row in rows]
+
+    # If nothing found, fallback to any card that does NOT match blocked keywords
+    if not ids:
+        rows = conn.execute(
+            f"SELECT id FROM waifu_cards WHERE NOT ({blocked_clause})",
+            like_params(BLOCKED_KEYWORDS)
+        ).fetchall()
+        ids = [row[0] for row in rows]
+
+    ELIGIBLE_CARD_IDS = array("i", ids)
+    _eligible_loaded_at = time.time()
+
+
+def pick_drop_card():
+    """Return a random eligible card row, or None if there is nothing to drop.
+    Blocking; drop_tracker runs it via asyncio.to_thread."""
+    if not ELIGIBLE_CARD_IDS or time.time() - _eligible_loaded_at > ELIGIBLE_REFRESH_SECS:
+        refresh_eligible_cards()
+
+    for _ in range(2):
+        if not ELIGIBLE_CARD_IDS:
+            return None
+        card = conn.execute(
+            "SELECT id, name, anime, rarity, event, media_type, media_file FROM waifu_cards WHERE id = ?",
+            (random.choice(ELIGIBLE_CARD_IDS),)
+        ).fetchone()
+        if card:
+            return card
+        # card was deleted since the last refresh
+        refresh_eligible_cards()
+    return None
+
+
+try:
+    refresh_eligible_cards()
+except sqlite3.Error:
+    # waifu_cards may not exist yet; drop_tracker retries lazily
+    pass
+
+
+async def get_bot_username(client):
+    """Return the bot's username, calling get_me() only until it succeeds once."""
+    global BOT_USERNAME
+    if BOT_USERNAME is None:
+        try:
+            me = await client.get_me()
+            if me and me.username:
+                BOT_USERNAME = me.username
+        except Exception:
+            pass
+    return BOT_USERNAME
+
+
+# ---------------- Batched drop writes ----------------
+# Drops are queued and written in one transaction per tick instead of one commit each.
+# current_drops can tolerate losing the last tick on a crash, but a drop is only
+# announced once its tick has committed, so /collect never sees the previous card.
+DROP_FLUSH_SECS = 0.25
+_PENDING_DROPS = {}  # {chat_id: waifu_id}
+_drop_flush_task = None
+_drop_tick = None  # future resolved when the currently pending drops are committed
+
+
+def write_drops(batch):
+    conn.executemany(
+        "INSERT OR REPLACE INTO current_drops (chat_id, waifu_id, collected_by) VALUES (?, ?, NULL)",
+        batch
+    )
+    conn.commit()
+
+
+async def _drop_flush_loop():
+    # runs only while drops are pending; queue_drop restarts it
+    global _drop_tick
+    while _PENDING_DROPS:
+        await asyncio.sleep(DROP_FLUSH_SECS)
+        batch = list(_PENDING_DROPS.items())
+        _PENDING_DROPS.clear()
+        tick, _drop_tick = _drop_tick, None
+        try:
+            await asyncio.to_thread(write_drops, batch)
+        except Exception as e:
+            print(f"❌ Failed to save drops: {e}")
+            tick.set_exception(e)
+        else:
+            tick.set_result(None)
+
+
+def queue_drop(chat_id, waifu_id):
+    """Queue a drop write; returns a future that resolves once it is committed."""
+    global _drop_flush_task, _drop_tick
+    _PENDING_DROPS[chat_id] = waifu_id
+    if _drop_tick is None:
+        _drop_tick = asyncio.get_running_loop().create_future()
+    if _drop_flush_task is None or _drop_flush_task.done():
+        _drop_flush_task = asyncio.create_task(_drop_flush_loop())
+    return _drop_tick
+
+
+def get_card(waifu_id):
+    return read_db.execute(
+        "SELECT id, name, anime, rarity, event, media_type, media_file FROM waifu_cards WHERE id = ?",
+        (waifu_id,)
+    ).fetchone()
+
+
 # ---------------- /setdrop Command ----------------
 @app.on_message(filters.command("setdrop") & filters.group, group=1)
 async def set_drop(client, message: Message):
@@ -81,20 +226,31 @@ async def set_drop(client, message: Message):
             await message.reply_text("⚠️ Normal users cannot set drop below 60 messages.")
             return
 
+    if target_msg > 2**31 - 1:
+        await message.reply_text("❌ Drop target is too large.")
+        return
+
     # Set drop
-    drop_settings[chat_id] = {"target": target_msg, "count": 0}
+    idx = CHAT_IDX.get(chat_id)
+    if idx is None:
+        CHAT_IDX[chat_id] = len(TARGETS)
+        TARGETS.append(target_msg)
+        COUNTS.append(0)
+    else:
+        TARGETS[idx] = target_msg
+        COUNTS[idx] = 0
     await message.reply_text(f"✅ Card drop set! A random card will drop after {target_msg} messages in this group.")
 
 
 # ---------------- /dropcount Command ----------------
 @app.on_message(filters.command("dropcount") & filters.group, group=1)
 async def drop_count(client, message: Message):
-    chat_id = message.chat.id
-    if chat_id not in drop_settings:
+    idx = CHAT_IDX.get(message.chat.id)
+    if idx is None:
         await message.reply_text("ℹ️ No card drop is configured for this group. Use /setdrop to enable drops.")
         return
 
-    remaining = drop_settings[chat_id]["target"] - drop_settings[chat_id]["count"]
+    remaining = TARGETS[idx] - COUNTS[idx]
     if remaining < 0:
         remaining = 0
     await message.reply_text(f"🎴 Messages remaining until next drop: {remaining}")
@@ -103,57 +259,25 @@ async def drop_count(client, message: Message):
 # ---------------- Message Tracker ----------------
 @app.on_message(filters.group, group=2)  # lower priority, runs after /start
 async def drop_tracker(client, message: Message):
-    chat_id = message.chat.id
-
-    # Ignore service messages
-    if message.service:
+    # Ignore service messages and commands (so /start and other commands are not blocked)
+    text = message.text
+    if message.service or (text and text[0] == "/"):
         return
 
-    # Ignore commands so /start and other commands are not blocked
-    if message.text and message.text.startswith("/"):
-        return
-
-    if chat_id not in drop_settings:
+    chat_id = message.chat.id
+    idx = CHAT_IDX.get(chat_id)
+    if idx is None:
         return
 
-    drop_settings[chat_id]["count"] += 1
-    if drop_settings[chat_id]["count"] < drop_settings[chat_id]["target"]:
+    COUNTS[idx] += 1
+    if COUNTS[idx] < TARGETS[idx]:
         return
 
     # Reset counter
-    drop_settings[chat_id]["count"] = 0
+    COUNTS[idx] = 0
 
-    # Try 1: select random card matching allowed keywords and NOT matching blocked keywords
     try:
-        allowed_clause = " OR ".join("rarity LIKE ?" for _ in ALLOWED_KEYWORDS)
-        blocked_clause = " OR ".join("rarity LIKE ?" for _ in BLOCKED_KEYWORDS)
-
-        query = f"""
-            SELECT id, name, anime, rarity, event, media_type, media_file
-            FROM waifu_cards
-            WHERE ({allowed_clause})
-              AND NOT ({blocked_clause})
-            ORDER BY RANDOM()
-            LIMIT 1
-        """
-        params = like_params(ALLOWED_KEYWORDS) + like_params(BLOCKED_KEYWORDS)
-        cursor.execute(query, params)
-        card = cursor.fetchone()
-
-        # If nothing found, fallback to selecting any card that does NOT match blocked keywords
-        if not card:
-            blocked_clause_only = " OR ".join("rarity LIKE ?" for _ in BLOCKED_KEYWORDS)
-            query2 = f"""
-                SELECT id, name, anime, rarity, event, media_type, media_file
-                FROM waifu_cards
-                WHERE NOT ({blocked_clause_only})
-                ORDER BY RANDOM()
-                LIMIT 1
-            """
-            params2 = like_params(BLOCKED_KEYWORDS)
-            cursor.execute(query2, params2)
-            card = cursor.fetchone()
-
+        card = await asyncio.to_thread(pick_drop_card)
         if not card:
             # Still none — there are no allowed cards in DB (or DB rarities are very different).
             # Do not drop in this case (prevents sending forbidden rarities).
@@ -164,19 +288,11 @@ async def drop_tracker(client, message: Message):
         print(f"❌ Error fetching card: {e}")
         return
 
-    # Save drop
-    cursor.execute(
-        "INSERT OR REPLACE INTO current_drops (chat_id, waifu_id, collected_by) VALUES (?, ?, NULL)",
-        (chat_id, card[0])
-    )
-    conn.commit()
+    # Save drop (committed with this tick's batch, awaited before announcing it)
+    saved = queue_drop(chat_id, card[0])
 
     # Prepare single deep-link PM button (only one button)
-    try:
-        me = await client.get_me()
-        bot_username = me.username if me and me.username else None
-    except Exception:
-        bot_username = None
+    bot_username = await get_bot_username(client)
 
     buttons = None
     if bot_username:
@@ -185,6 +301,12 @@ async def drop_tracker(client, message: Message):
             [[InlineKeyboardButton("Open in PM for details", url=pm_url)]]
         )
 
+    try:
+        await saved
+    except Exception:
+        # row not written: announcing it would let /collect match the previous drop
+        return
+
     # Send drop message
     drop_text = "🎉 A new waifu card has appeared! 🎴\nType /collect <name> to claim it before someone else!"
     try:
@@ -214,11 +336,7 @@ async def start_with_card(client, message: Message):
         return
 
     try:
-        cursor.execute(
-            "SELECT id, name, anime, rarity, event, media_type, media_file FROM waifu_cards WHERE id = ?",
-            (waifu_id,)
-        )
-        card = cursor.fetchone()
+        card = await asyncio.to_thread(get_card, waifu_id)
         if not card:
             await message.reply_text("❌ Card not found.")
             return
@@ -3,34 +3,123 @@ from pyrogram import filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ChatMemberUpdated
 from config import Config, app
 from database import Database
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 import asyncio
 import os
-import sqlite3
 
 db = Database()
+# bound once; the helpers below run on every /start and group add
+_CONN = db.conn
+_CUR = db.cursor
 
 # image paths (keep your filenames)
 LOG_IMAGE_PATH = "log.jpg"
 WELCOME_IMAGE_PATH = "welcome.jpg"
 GROUP_LOG_IMAGE = "photo_2025-08-22_11-52-42.jpg"
 
+# static files: check once at import instead of a stat() per handler call
+_HAS_WELCOME = os.path.exists(WELCOME_IMAGE_PATH)
+_HAS_GROUP_LOG = os.path.exists(GROUP_LOG_IMAGE)
+
+# Asia/Kolkata (UTC+5:30), built once for log timestamps
+_IST = timezone(timedelta(hours=5, minutes=30))
+
+# Reply keyboards: URLs come from Config and never change, so build them once
+_ADD_GROUP_URL = f"https://t.me/{Config.BOT_USERNAME}?startgroup=true"
+_OWNER_URL = f"https://t.me/{Config.OWNER_USERNAME.strip('@')}"
+_WELCOME_BUTTONS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add me to Group", url=_ADD_GROUP_URL)],
+    [InlineKeyboardButton("💬 Support Group", url=Config.SUPPORT_GROUP),
+     InlineKeyboardButton("📢 Update Channel", url=Config.UPDATE_CHANNEL)],
+    [InlineKeyboardButton("👑 Owner", url=_OWNER_URL)]
+])
+_GROUP_BUTTONS = InlineKeyboardMarkup(
+    [[InlineKeyboardButton("➕ Add me to your group", url=_ADD_GROUP_URL)],
+     [InlineKeyboardButton("💬 Support Group", url=Config.SUPPORT_GROUP),
+      InlineKeyboardButton("📢 Update Channel", url=Config.UPDATE_CHANNEL)]]
+)
+
+# Message templates, filled with str.format_map per call
+_WELCOME_TMPL = """
+🌸 𝒲𝑒𝓁𝒸𝑜𝓂𝑒, 𝒟𝒶𝓇𝓁𝒾𝓃𝑔! 🌸
+
+🍰 You’ve been warmly greeted by **Alisa Mikhailovna Kujou** 💕
+
+👤 **User Info**:
+🌸 Name: {first_name}
+🏷️ Username: @{username}
+🆔 ID: {user_id}
+
+📜 **Available Commands:**
+Type /help to explore 🎀
+
+✨ “Let’s collect waifus and build memories together~” 💫
+"""
+
+_NEW_USER_TMPL = (
+    "🎀 NEW SOUL JOINED ALISA 🎀\n\n"
+    "👤 Name: {first_name}\n"
+    "🔗 Username: @{username}\n"
+    "🆔 User ID: `{user_id}`\n"
+    "📍 Source: {source}\n"
+    "📅 First Interaction: {dt_str} (IST)\n\n"
+    "Welcome message delivered successfully 💖"
+)
+
+_GROUP_ADDED_TMPL = (
+    "🚀 BOT ADDED TO A NEW GROUP 🚀\n\n"
+    "💬 Group Name: **{chat_title}**\n"
+    "🆔 Group ID: `{chat_id}`\n\n"
+    "👤 Added By:\n"
+    "• Name: {inviter_name}\n"
+    "• Username: @{inviter_username}\n"
+    "• User ID: `{inviter_id}`\n\n"
+    "📅 Time: {dt_str} (IST)\n\n"
+    "Status:\n• Group greeting sent\n• Bot active\n\n— Alisa System 🤍"
+)
+
+_GROUP_GREETING = (
+    "✨ Thank you for welcoming me into this lovely group! ✨\n\n"
+    "I’m *Alisa* 💕\n"
+    "A waifu who brings beauty, fun, and magic to your chats 🌸\n\n"
+    "🎴 Start collecting waifus TODAY\n"
+    "🎮 Play games & earn rewards\n"
+    "💞 Compete, trade, and rise together\n\n"
+    "Type /start in private to begin your personal journey\nor use /help to see what I can do here 💫\n\n"
+    "Let’s make this group more alive and adorable together~ 💖"
+)
+
 # small emoji animation (fallback when reactions not available)
 REACTION_SEQUENCE = ["🌸", "⛈️", "☀️"]
 DELAY_BETWEEN = 0.5
 EPHEMERAL_LIFETIME = 1.0
 
-# In-process guards to avoid duplicate sends inside same process
-_NOTIFIED_USERS = set()
-_NOTIFIED_GROUPS = set()
+# In-process guards to avoid duplicate sends inside same process.
+# Bounded LRUs: the sqlite mark is the source of truth, these only skip the DB hit.
+_NOTIFIED_MAX = 50_000
+_NOTIFIED_USERS = OrderedDict()
+_NOTIFIED_GROUPS = OrderedDict()
+
+
+def _seen(cache, key):
+    """True if key is cached (and refresh its LRU position)."""
+    if key in cache:
+        cache.move_to_end(key)
+        return True
+    return False
+
+
+def _remember(cache, key):
+    """Cache key, evicting the least recently seen entry past _NOTIFIED_MAX."""
+    cache[key] = None
+    if len(cache) > _NOTIFIED_MAX:
+        cache.popitem(last=False)
 
 # Ensure helper small tables to track notifications exist (best-effort)
 def ensure_tracking_tables():
     try:
-        cur = getattr(db, "cursor", None)
-        conn = getattr(db, "conn", None)
-        if cur is None:
-            return
+        cur = _CUR
         cur.execute("""
         CREATE TABLE IF NOT EXISTS user_logs (
             user_id INTEGER PRIMARY KEY,
@@ -44,17 +133,123 @@ def ensure_tracking_tables():
             added_at TEXT
         )
         """)
-        if conn:
-            conn.commit()
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS file_id_cache (
+            key TEXT PRIMARY KEY,
+            file_id TEXT
+        )
+        """)
+        _CONN.commit()
     except Exception:
         try:
-            if conn:
-                conn.rollback()
+            _CONN.rollback()
+        except Exception:
+            pass
+
+    # Index backing the /top aggregation (users / user_profiles are already keyed on
+    # user_id). /tdtop reads daily_totals, so the old last_collected index is dropped:
+    # it only cost an extra write on every user_waifus change. Separate tries.
+    for sql in (
+        "CREATE INDEX IF NOT EXISTS idx_uw_user_amount ON user_waifus(user_id, amount)",
+        "DROP INDEX IF EXISTS idx_uw_lastcoll",
+    ):
+        try:
+            _CUR.execute(sql)
+        except Exception:
+            pass
+    ensure_daily_totals()
+
+    try:
+        # Gather planner stats once so the new indexes get picked
+        _CUR.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        if not _CUR.fetchone():
+            _CUR.execute("ANALYZE")
+        _CONN.commit()
+    except Exception:
+        pass
+
+def ensure_daily_totals():
+    """
+    Per-user, per-IST-day collected counts for /tdtop, maintained by triggers on
+    user_waifus so the daily leaderboard is an indexed lookup instead of a full scan.
+    """
+    try:
+        cur = _CUR
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            user_id INTEGER,
+            ist_date TEXT,
+            total INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, ist_date)
+        )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_daily_totals_date ON daily_totals(ist_date, total)")
+        # Keyed on last_collected (epoch seconds) like the old /tdtop scan, so rows written
+        # with an old timestamp (e.g. a /reset restore) land on their own day, not today.
+        # New rows count their whole amount, increments count the delta (IST = UTC+05:30).
+        # Dropped and recreated so databases with an older trigger body pick this one up.
+        cur.execute("DROP TRIGGER IF EXISTS trg_uw_daily_insert")
+        cur.execute("DROP TRIGGER IF EXISTS trg_uw_daily_update")
+        cur.execute("""
+        CREATE TRIGGER trg_uw_daily_insert AFTER INSERT ON user_waifus
+        WHEN NEW.last_collected IS NOT NULL
+        BEGIN
+            INSERT INTO daily_totals (user_id, ist_date, total)
+            VALUES (NEW.user_id, date(NEW.last_collected, 'unixepoch', '+330 minutes'), COALESCE(NEW.amount, 1))
+            ON CONFLICT(user_id, ist_date) DO UPDATE SET total = total + excluded.total;
+        END
+        """)
+        cur.execute("""
+        CREATE TRIGGER trg_uw_daily_update AFTER UPDATE OF amount ON user_waifus
+        WHEN NEW.amount > OLD.amount AND NEW.last_collected IS NOT NULL
+        BEGIN
+            INSERT INTO daily_totals (user_id, ist_date, total)
+            VALUES (NEW.user_id, date(NEW.last_collected, 'unixepoch', '+330 minutes'), NEW.amount - OLD.amount)
+            ON CONFLICT(user_id, ist_date) DO UPDATE SET total = total + excluded.total;
+        END
+        """)
+        _CONN.commit()
+    except Exception:
+        try:
+            _CONN.rollback()
         except Exception:
             pass
 
 ensure_tracking_tables()
 
+# Telegram file_ids of static images we've already uploaded once: {key: file_id}
+_FILE_IDS = {}
+try:
+    _CUR.execute("SELECT key, file_id FROM file_id_cache")
+    _FILE_IDS.update(_CUR.fetchall())
+except Exception:
+    pass
+
+def _remember_file_id(key: str, file_id):
+    _FILE_IDS[key] = file_id
+    try:
+        _CUR.execute("INSERT OR REPLACE INTO file_id_cache (key, file_id) VALUES (?, ?)", (key, file_id))
+        _CONN.commit()
+    except Exception:
+        pass
+
+async def _send_cached_photo(send, key: str, path: str, **kwargs):
+    """
+    Call send(photo=...) with the cached Telegram file_id for `key`, uploading `path`
+    only when nothing is cached (or the cached id stopped working).
+    """
+    file_id = _FILE_IDS.get(key)
+    if file_id:
+        try:
+            return await send(photo=file_id, **kwargs)
+        except Exception:
+            _FILE_IDS.pop(key, None)
+    sent = await send(photo=path, **kwargs)
+    photo = getattr(sent, "photo", None)
+    if photo and getattr(photo, "file_id", None):
+        _remember_file_id(key, photo.file_id)
+    return sent
+
 # Helpers
 def is_private_chat(message) -> bool:
     try:
@@ -71,69 +266,38 @@ def is_private_chat(message) -> bool:
 
 def _atomic_insert_one(table: str, key_col: str, key_val, extra_cols=None):
     """
-    Generic atomic insert-or-ignore using db.conn (BEGIN IMMEDIATE).
+    Generic atomic insert-if-absent using a single
+    INSERT ... ON CONFLICT(key_col) DO NOTHING RETURNING 1 on _CONN.
     Returns True if inserted (i.e. was not present), False otherwise.
     """
+    cur = _CUR
+    cols = [key_col]
+    vals = [key_val]
+    if extra_cols:
+        cols.extend(extra_cols.keys())
+        vals.extend(extra_cols.values())
+    placeholders = ",".join("?" for _ in cols)
     try:
-        conn = getattr(db, "conn", None)
-        cur = getattr(db, "cursor", None)
-        if conn is None or cur is None:
-            # fallback non-atomic: try select + insert
-            try:
-                cur = getattr(db, "cursor")
-                cur.execute(f"SELECT 1 FROM {table} WHERE {key_col} = ?", (key_val,))
-                if cur.fetchone():
-                    return False
-                cols = [key_col]
-                vals = [key_val]
-                if extra_cols:
-                    for c, v in extra_cols.items():
-                        cols.append(c)
-                        vals.append(v)
-                placeholders = ",".join("?" for _ in cols)
-                cur.execute(f"INSERT OR IGNORE INTO {table} ({','.join(cols)}) VALUES ({placeholders})", tuple(vals))
-                getattr(db, "conn").commit()
-                return True
-            except Exception:
-                return False
-
-        conn.execute("BEGIN IMMEDIATE")
-        cur.execute(f"SELECT 1 FROM {table} WHERE {key_col} = ?", (key_val,))
-        if cur.fetchone():
-            conn.commit()
-            return False
-
-        cols = [key_col]
-        vals = [key_val]
-        if extra_cols:
-            for c, v in extra_cols.items():
-                cols.append(c)
-                vals.append(v)
-        placeholders = ",".join("?" for _ in cols)
-        cur.execute(f"INSERT OR IGNORE INTO {table} ({','.join(cols)}) VALUES ({placeholders})", tuple(vals))
-        conn.commit()
-        return True
-    except sqlite3.OperationalError:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
-        return False
+        cur.execute(
+            f"INSERT INTO {table} ({','.join(cols)}) VALUES ({placeholders}) "
+            f"ON CONFLICT({key_col}) DO NOTHING RETURNING 1",
+            tuple(vals)
+        )
+        inserted = cur.fetchone() is not None
+        _CONN.commit()
+        return inserted
     except Exception:
         try:
-            if conn:
-                conn.rollback()
+            _CONN.rollback()
         except Exception:
             pass
         return False
 
 async def download_profile_photo(client, user_id: int):
-    # return local path or None
+    # return in-memory BytesIO or None (nothing is written to disk)
     try:
         async for p in client.get_chat_photos(user_id, limit=1):
-            path = await client.download_media(p.file_id)
-            return path
+            return await client.download_media(p.file_id, in_memory=True)
     except Exception:
         return None
     return None
@@ -147,44 +311,91 @@ def mark_user_started_atomic(user_id: int):
 def mark_group_added_atomic(chat_id: int, title: str):
     return _atomic_insert_one("group_logs", "chat_id", chat_id, {"title": title, "added_at": datetime.utcnow().isoformat()})
 
-# ---------------- START Handler ----------------
-@app.on_message(filters.command("start"))
-async def start_cmd(client, message):
-    # ignore other bots
-    if message.from_user and getattr(message.from_user, "is_bot", False):
+# Strong refs to fire-and-forget tasks so they aren't garbage-collected mid-run
+_BACKGROUND_TASKS = set()
+
+async def _play_reaction_animation(client, chat_id, msg_id):
+    """React to the /start message frame by frame; fall back to an ephemeral emoji message."""
+    send = client.send_reaction
+    delay = DELAY_BETWEEN
+    # Each frame overwrites the previous reaction, so don't wait for Telegram's ack:
+    # fire the RPC, and cancel a frame still in flight when the next one starts.
+    tasks = []
+    for em in REACTION_SEQUENCE:
+        if tasks:
+            prev = tasks[-1]
+            if not prev.done():
+                prev.cancel()
+            elif not prev.cancelled() and prev.exception() is not None:
+                break
+        tasks.append(asyncio.create_task(send(chat_id=chat_id, message_id=msg_id, emoji=em)))
+        await asyncio.sleep(delay)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    if not any(isinstance(r, Exception) for r in results):
+        # every frame reacted (or was superseded), no fallback needed
         return
 
-    # small emoji animation or reactions
-    msg_id = getattr(message, "id", None) or getattr(message, "message_id", None)
-    reacted = False
-    if msg_id:
-        for em in REACTION_SEQUENCE:
+    try:
+        ephemeral = await client.send_message(chat_id=chat_id, reply_to_message_id=msg_id, text=REACTION_SEQUENCE[0])
+        eph_chat_id = ephemeral.chat.id
+        eph_id = getattr(ephemeral, "id", getattr(ephemeral, "message_id", None))
+        for frame in REACTION_SEQUENCE[1:]:
+            await asyncio.sleep(delay)
             try:
-                await client.send_reaction(chat_id=message.chat.id, message_id=msg_id, emoji=em)
-                reacted = True
+                await client.edit_message_text(chat_id=eph_chat_id, message_id=eph_id, text=frame)
             except Exception:
-                reacted = False
                 break
-            await asyncio.sleep(DELAY_BETWEEN)
+        if EPHEMERAL_LIFETIME > 0:
+            await asyncio.sleep(EPHEMERAL_LIFETIME)
+            try:
+                await client.delete_messages(chat_id=eph_chat_id, message_ids=eph_id)
+            except Exception:
+                pass
+    except Exception:
+        pass
 
-    if not reacted and msg_id:
+async def _notify_support(client, user_id, caption):
+    """Post the new-user log to the support chat, with the user's profile photo if any."""
+    try:
+        photo = await download_profile_photo(client, user_id)
+        if photo:
+            try:
+                await client.send_photo(chat_id=Config.SUPPORT_CHAT_ID, photo=photo, caption=caption)
+            except Exception:
+                await client.send_message(chat_id=Config.SUPPORT_CHAT_ID, text=caption)
+        else:
+            await client.send_message(chat_id=Config.SUPPORT_CHAT_ID, text=caption)
+    except Exception:
         try:
-            ephemeral = await client.send_message(chat_id=message.chat.id, reply_to_message_id=msg_id, text=REACTION_SEQUENCE[0])
-            for frame in REACTION_SEQUENCE[1:]:
-                await asyncio.sleep(DELAY_BETWEEN)
-                try:
-                    await client.edit_message_text(chat_id=ephemeral.chat.id, message_id=getattr(ephemeral, "id", getattr(ephemeral, "message_id", None)), text=frame)
-                except Exception:
-                    break
-            if EPHEMERAL_LIFETIME > 0:
-                await asyncio.sleep(EPHEMERAL_LIFETIME)
-                try:
-                    await client.delete_messages(chat_id=ephemeral.chat.id, message_ids=getattr(ephemeral, "id", getattr(ephemeral, "message_id", None)))
-                except Exception:
-                    pass
+            await client.send_message(chat_id=Config.SUPPORT_CHAT_ID, text=caption)
         except Exception:
             pass
 
+async def _send_welcome(message, welcome_text):
+    """Welcome message to user (or in group when /start used in group DM deep link)."""
+    try:
+        if _HAS_WELCOME:
+            await _send_cached_photo(message.reply_photo, "welcome_img", WELCOME_IMAGE_PATH, caption=welcome_text, reply_markup=_WELCOME_BUTTONS)
+        else:
+            await message.reply_text(text=welcome_text, reply_markup=_WELCOME_BUTTONS)
+    except Exception:
+        # ignore send errors (permissions, flood, etc.)
+        pass
+
+# ---------------- START Handler ----------------
+@app.on_message(filters.command("start"))
+async def start_cmd(client, message):
+    # ignore other bots
+    if message.from_user and getattr(message.from_user, "is_bot", False):
+        return
+
+    # small emoji animation or reactions, in the background so the welcome isn't delayed
+    msg_id = getattr(message, "id", None) or getattr(message, "message_id", None)
+    if msg_id:
+        task = asyncio.create_task(_play_reaction_animation(client, message.chat.id, msg_id))
+        _BACKGROUND_TASKS.add(task)
+        task.add_done_callback(_BACKGROUND_TASKS.discard)
+
     user = message.from_user
     user_id = user.id
     username = user.username if user.username else "None"
@@ -197,93 +408,55 @@ async def start_cmd(client, message):
     except Exception:
         pass
 
-    # One-time support notification: attempt atomic mark, then if newly inserted send support message
+    # One-time support notification: attempt atomic mark, then if newly inserted build the support message
+    support_caption = None
     try:
         # fast in-process guard
-        if user_id in _NOTIFIED_USERS:
+        if _seen(_NOTIFIED_USERS, user_id):
             newly = False
         else:
             newly = mark_user_started_atomic(user_id)
             if newly:
-                _NOTIFIED_USERS.add(user_id)
+                _remember(_NOTIFIED_USERS, user_id)
 
         if newly:
             source = "private" if is_private_chat(message) else getattr(message.chat, "title", "group")
-            now = datetime.utcnow()
-            try:
-                ist = now.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=5, minutes=30)))
-                dt_str = ist.strftime("%d/%m/%Y %H:%M:%S")
-            except Exception:
-                dt_str = now.strftime("%d/%m/%Y %H:%M:%S")
-
-            caption = (
-                "🎀 NEW SOUL JOINED ALISA 🎀\n\n"
-                f"👤 Name: {first_name}\n"
-                f"🔗 Username: @{username}\n"
-                f"🆔 User ID: `{user_id}`\n"
-                f"📍 Source: {source}\n"
-                f"📅 First Interaction: {dt_str} (IST)\n\n"
-                "Welcome message delivered successfully 💖"
-            )
-
-            # try attach profile photo
-            ppath = None
-            try:
-                ppath = await download_profile_photo(client, user_id)
-                if ppath and os.path.exists(ppath):
-                    try:
-                        await client.send_photo(chat_id=Config.SUPPORT_CHAT_ID, photo=ppath, caption=caption)
-                    except Exception:
-                        await client.send_message(chat_id=Config.SUPPORT_CHAT_ID, text=caption)
-                    finally:
-                        try:
-                            os.remove(ppath)
-                        except Exception:
-                            pass
-                else:
-                    await client.send_message(chat_id=Config.SUPPORT_CHAT_ID, text=caption)
-            except Exception:
-                try:
-                    await client.send_message(chat_id=Config.SUPPORT_CHAT_ID, text=caption)
-                except Exception:
-                    pass
+            dt_str = datetime.now(_IST).strftime("%d/%m/%Y %H:%M:%S")
+
+            support_caption = _NEW_USER_TMPL.format_map({
+                "first_name": first_name, "username": username, "user_id": user_id,
+                "source": source, "dt_str": dt_str,
+            })
     except Exception:
         pass
 
     # Welcome message to user (or in group when /start used in group DM deep link)
-    welcome_text = f"""
-🌸 𝒲𝑒𝓁𝒸𝑜𝓂𝑒, 𝒟𝒶𝓇𝓁𝒾𝓃𝑔! 🌸
-
-🍰 You’ve been warmly greeted by **Alisa Mikhailovna Kujou** 💕
-
-👤 **User Info**:
-🌸 Name: {first_name}
-🏷️ Username: @{username}
-🆔 ID: {user_id}
-
-📜 **Available Commands:**
-Type /help to explore 🎀
-
-✨ “Let’s collect waifus and build memories together~” 💫
-"""
-    buttons = InlineKeyboardMarkup([
-        [InlineKeyboardButton("➕ Add me to Group", url=f"https://t.me/{Config.BOT_USERNAME}?startgroup=true")],
-        [InlineKeyboardButton("💬 Support Group", url=Config.SUPPORT_GROUP),
-         InlineKeyboardButton("📢 Update Channel", url=Config.UPDATE_CHANNEL)],
-        [InlineKeyboardButton("👑 Owner", url=f"https://t.me/{Config.OWNER_USERNAME.strip('@')}")]
-    ])
+    welcome_text = _WELCOME_TMPL.format_map({"first_name": first_name, "username": username, "user_id": user_id})
+
+    if support_caption:
+        # Support log and welcome are independent RPCs: send them concurrently
+        await asyncio.gather(
+            _notify_support(client, user_id, support_caption),
+            _send_welcome(message, welcome_text),
+            return_exceptions=True,
+        )
+    else:
+        await _send_welcome(message, welcome_text)
 
+# ---------------- GROUP-ADDED Handler ----------------
+# Only let updates about the bot itself through; other members joining/leaving
+# busy groups are dropped in dispatch without scheduling the handler.
+@filters.create
+async def bot_member_filter(_, client, event):
     try:
-        if os.path.exists(WELCOME_IMAGE_PATH):
-            await message.reply_photo(photo=WELCOME_IMAGE_PATH, caption=welcome_text, reply_markup=buttons)
-        else:
-            await message.reply_text(text=welcome_text, reply_markup=buttons)
+        new = getattr(event, "new_chat_member", None)
+        user = getattr(new, "user", None) if new else None
+        me = getattr(client, "me", None)
+        return bool(user and me and user.id == me.id)
     except Exception:
-        # ignore send errors (permissions, flood, etc.)
-        pass
+        return False
 
-# ---------------- GROUP-ADDED Handler ----------------
-@app.on_chat_member_updated()
+@app.on_chat_member_updated(bot_member_filter)
 async def bot_added_to_group(client, event: ChatMemberUpdated):
     try:
         new = getattr(event, "new_chat_member", None) or getattr(event, "new_chat_member", None)
@@ -300,9 +473,6 @@ async def bot_added_to_group(client, event: ChatMemberUpdated):
         if not new_user:
             return
 
-        if new_user.id != client.me.id:
-            return
-
         chat = getattr(event, "chat", None) or getattr(event, "chat", None)
         if not chat:
             return
@@ -310,31 +480,16 @@ async def bot_added_to_group(client, event: ChatMemberUpdated):
         chat_title = getattr(chat, "title", "Unknown Group")
 
         # fast in-process guard
-        if chat_id in _NOTIFIED_GROUPS:
+        if _seen(_NOTIFIED_GROUPS, chat_id):
             already = False
         else:
             already = mark_group_added_atomic(chat_id, chat_title)
             if already:
-                _NOTIFIED_GROUPS.add(chat_id)
+                _remember(_NOTIFIED_GROUPS, chat_id)
 
         # Send greeting inside the group (try once)
         try:
-            group_greeting = (
-                "✨ Thank you for welcoming me into this lovely group! ✨\n\n"
-                "I’m *Alisa* 💕\n"
-                "A waifu who brings beauty, fun, and magic to your chats 🌸\n\n"
-                "🎴 Start collecting waifus TODAY\n"
-                "🎮 Play games & earn rewards\n"
-                "💞 Compete, trade, and rise together\n\n"
-                "Type /start in private to begin your personal journey\nor use /help to see what I can do here 💫\n\n"
-                "Let’s make this group more alive and adorable together~ 💖"
-            )
-            group_buttons = InlineKeyboardMarkup(
-                [[InlineKeyboardButton("➕ Add me to your group", url=f"https://t.me/{Config.BOT_USERNAME}?startgroup=true")],
-                 [InlineKeyboardButton("💬 Support Group", url=Config.SUPPORT_GROUP),
-                  InlineKeyboardButton("📢 Update Channel", url=Config.UPDATE_CHANNEL)]]
-            )
-            await client.send_message(chat_id=chat_id, text=group_greeting, reply_markup=group_buttons)
+            await client.send_message(chat_id=chat_id, text=_GROUP_GREETING, reply_markup=_GROUP_BUTTONS)
         except Exception:
             pass
 
@@ -352,27 +507,16 @@ async def bot_added_to_group(client, event: ChatMemberUpdated):
             except Exception:
                 pass
 
-            now = datetime.utcnow()
-            try:
-                ist = now.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=5, minutes=30)))
-                dt_str = ist.strftime("%d/%m/%Y %H:%M:%S")
-            except Exception:
-                dt_str = now.strftime("%d/%m/%Y %H:%M:%S")
-
-            support_caption = (
-                "🚀 BOT ADDED TO A NEW GROUP 🚀\n\n"
-                f"💬 Group Name: **{chat_title}**\n"
-                f"🆔 Group ID: `{chat_id}`\n\n"
-                "👤 Added By:\n"
-                f"• Name: {inviter_name}\n"
-                f"• Username: @{inviter_username}\n"
-                f"• User ID: `{inviter_id}`\n\n"
-                f"📅 Time: {dt_str} (IST)\n\n"
-                "Status:\n• Group greeting sent\n• Bot active\n\n— Alisa System 🤍"
-            )
+            dt_str = datetime.now(_IST).strftime("%d/%m/%Y %H:%M:%S")
+
+            support_caption = _GROUP_ADDED_TMPL.format_map({
+                "chat_title": chat_title, "chat_id": chat_id,
+                "inviter_name": inviter_name, "inviter_username": inviter_username,
+                "inviter_id": inviter_id, "dt_str": dt_str,
+            })
             try:
-                if os.path.exists(GROUP_LOG_IMAGE):
-                    await client.send_photo(chat_id=Config.SUPPORT_CHAT_ID, photo=GROUP_LOG_IMAGE, caption=support_caption)
+                if _HAS_GROUP_LOG:
+                    await _send_cached_photo(client.send_photo, "group_log_img", GROUP_LOG_IMAGE, chat_id=Config.SUPPORT_CHAT_ID, caption=support_caption)
                 else:
                     await client.send_message(chat_id=Config.SUPPORT_CHAT_ID, text=support_caption)
             except Exception:
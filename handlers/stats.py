@@ -2,6 +2,7 @@
 from pyrogram import filters
 from config import app, Config
 from database import Database
+import asyncio
 import os
 
 db = Database()
@@ -27,6 +28,52 @@ RARITIES = [
     ("💋", "Forbidden Desire"),
     ("📽", "Cinematic Legend"),
 ]
+# Known rarity names, for spotting "other" rarities in O(1)
+_HUMAN_SET = frozenset(h for _, h in RARITIES)
+
+_STATS_HEADER = "📊 **Bot Stats**\n\n"
+
+# Both totals in one statement (scalar subqueries -> a single row)
+_TOTALS_SQL = "SELECT (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM groups)"
+
+
+def _fetch_stats():
+    """Run every /stats query in one go; meant for asyncio.to_thread.
+
+    Returns (total_users, total_groups, rarity_counts, recent_rows). Each part
+    is best-effort: a failed query yields 0 / {} / None instead of raising.
+    Uses conn.execute so the worker thread gets its own cursor.
+    """
+    conn = db.conn
+    try:
+        total_users, total_groups = conn.execute(_TOTALS_SQL).fetchone()
+    except Exception:
+        # groups table may be missing on old databases: count users alone
+        try:
+            total_users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        except Exception:
+            total_users = 0
+        total_groups = 0
+
+    # Per-rarity counts keyed by the raw (stripped) rarity string
+    rarity_counts = {}
+    try:
+        for r, c in conn.execute("SELECT rarity, COUNT(*) FROM waifu_cards GROUP BY rarity"):
+            if r is None:
+                continue
+            rarity_counts[str(r).strip()] = int(c)
+    except Exception:
+        rarity_counts = {}
+
+    try:
+        recent = conn.execute(
+            "SELECT id, name, anime, rarity, added_by FROM waifu_cards ORDER BY id DESC LIMIT 3"
+        ).fetchall()
+    except Exception:
+        recent = None
+
+    return total_users or 0, total_groups or 0, rarity_counts, recent
+
 
 @ app.on_message(filters.command("stats"))
 async def stats_cmd(client, message):
@@ -38,81 +85,46 @@ async def stats_cmd(client, message):
         return
 
     try:
-        # Total users (best-effort, fallback to 0)
-        try:
-            db.cursor.execute("SELECT COUNT(*) FROM users")
-            total_users = db.cursor.fetchone()[0] or 0
-        except Exception:
-            total_users = 0
-
-        # Total groups (try Database helper, otherwise query groups table)
-        try:
-            total_groups = db.get_total_groups()
-        except Exception:
-            try:
-                db.cursor.execute("SELECT COUNT(*) FROM groups")
-                total_groups = db.cursor.fetchone()[0] or 0
-            except Exception:
-                total_groups = 0
-
-        # Per-rarity counts: we will try to use the defined RARITIES ordering first.
-        rarity_counts = {}
-        try:
-            # Query counts grouped by rarity (raw string matching)
-            db.cursor.execute("SELECT rarity, COUNT(*) FROM waifu_cards GROUP BY rarity")
-            rows = db.cursor.fetchall()
-            # normalize mapping
-            for r, c in rows:
-                if r is None:
-                    continue
-                rarity_counts[str(r).strip()] = int(c)
-        except Exception:
-            rarity_counts = {}
+        total_users, total_groups, rarity_counts, recent = await asyncio.to_thread(_fetch_stats)
 
         # Build rarities text in our preferred order (fall back to any remaining DB rarities)
-        rarities_lines = []
-        for emoji, human in RARITIES:
-            cnt = rarity_counts.get(human, 0)
-            rarities_lines.append(f"{emoji} {human} → {cnt}")
+        rarities_body = "\n".join(f"{emoji} {human} → {rarity_counts.get(human, 0)}" for emoji, human in RARITIES)
 
         # If there are rarities in DB not in our list, show them too
-        extra = []
-        for r, cnt in rarity_counts.items():
-            if r not in [h for _, h in RARITIES]:
-                extra.append(f"• {r} → {cnt}")
-        if extra:
-            rarities_lines.append("\n-- Other rarities in DB --")
-            rarities_lines.extend(extra)
+        extra_rarities = [r for r in rarity_counts if r not in _HUMAN_SET]
+        if extra_rarities:
+            rarities_body += "\n\n-- Other rarities in DB --\n" + "\n".join(
+                f"• {r} → {rarity_counts[r]}" for r in extra_rarities
+            )
 
         # Recently added 3 waifus (by id DESC)
         recent_lines = []
-        try:
-            db.cursor.execute("SELECT id, name, anime, rarity, added_by FROM waifu_cards ORDER BY id DESC LIMIT 3")
-            recent = db.cursor.fetchall()
-            if recent:
-                for row in recent:
-                    wid = row[0]
-                    name = row[1] or "Unknown"
-                    anime = row[2] or "Unknown"
-                    rarity = row[3] or "Unknown"
-                    added_by = row[4] if len(row) > 4 else None
-                    by_text = f" (added by {added_by})" if added_by else ""
-                    recent_lines.append(f"#{wid} — {name} | {anime} | {rarity}{by_text}")
-            else:
-                recent_lines.append("No recently added waifus found.")
-        except Exception:
+        if recent is None:
             recent_lines.append("Failed to fetch recent waifus.")
+        elif recent:
+            for row in recent:
+                wid = row[0]
+                name = row[1] or "Unknown"
+                anime = row[2] or "Unknown"
+                rarity = row[3] or "Unknown"
+                added_by = row[4] if len(row) > 4 else None
+                by_text = f" (added by {added_by})" if added_by else ""
+                recent_lines.append(f"#{wid} — {name} | {anime} | {rarity}{by_text}")
+        else:
+            recent_lines.append("No recently added waifus found.")
 
         # Build final message
-        stats_text = "📊 **Bot Stats**\n\n"
+        stats_text = _STATS_HEADER
         stats_text += f"👥 Total Users: {total_users}\n"
         stats_text += f"👑 Total Groups Bot Added: {total_groups}\n\n"
         stats_text += "🌸 **Rarity Breakdown**\n"
-        stats_text += "\n".join(rarities_lines) + "\n\n"
+        stats_text += rarities_body + "\n\n"
         stats_text += "🆕 **Recently added (latest 3)**\n"
         stats_text += "\n".join(recent_lines) + "\n"
 
-        # Send with Stats.jpg if present in working directory (will be deleted locally if found)
+        # Send with Stats.jpg if present in working directory (will be deleted locally if found).
+        # Checked per call, not at import: the file is deleted after each send. Without the
+        # check pyrogram would treat the missing path as a file_id.
         image_path = "Stats.jpg"
         if os.path.exists(image_path):
             try:
@@ -3,6 +3,8 @@
 from pyrogram import filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from config import app, Config
+import asyncio
+import atexit
 import sqlite3
 import re
 
@@ -17,67 +19,209 @@ ITEM_COL_HINTS = [
     "waifu", "waifu_id", "card", "card_id", "collection", "collection_id", "item", "item_id"
 ]
 
+_OWNERSHIP_SET = frozenset(OWNERSHIP_COLS)
+_ITEM_HINTS_SET = frozenset(ITEM_COL_HINTS)
+# Table names that are collections even without an item-like column
+_PROMISING_TABLE_NAMES = frozenset({"user_cards", "user_waifus", "user_collections", "owned_waifus", "user_items"})
+
 # Tables we should never touch for transfer
-EXCLUDE_TABLES = {"users", "user_claims", "waifu_cards", "sqlite_sequence"}
+EXCLUDE_TABLES = {
+    "users", "user_claims", "waifu_cards", "sqlite_sequence",
+    # bookkeeping tables from other handlers: never collections, skip their PRAGMA table_info
+    "user_contacts", "user_logs", "group_logs", "file_id_cache", "daily_totals",
+}
+
+# Callback payload (confirm or cancel), compiled once; the handler reads the filter's captures
+_TRANSFER_CB_RE = re.compile(r"^transfer_(confirm|cancel):(\d+):(\d+)$")
+
+# One long-lived connection for all transfer commands (autocommit: transactions are
+# opened explicitly). _DB_LOCK keeps a /transfer preview and a confirm from interleaving.
+_CONN = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=256)
+_CONN.execute("PRAGMA journal_mode=WAL")
+_CONN.execute("PRAGMA synchronous=NORMAL")
+try:
+    # refresh planner stats once per process, bounded work
+    _CONN.execute("PRAGMA analysis_limit=400")
+    _CONN.execute("PRAGMA optimize")
+except Exception:
+    pass
+_DB_LOCK = asyncio.Lock()
+
+
+def _close_conn():
+    """PRAGMA optimize, then close; registered with atexit."""
+    try:
+        _CONN.execute("PRAGMA optimize")
+    except Exception:
+        pass
+    finally:
+        _CONN.close()
+
 
-# Build a DB connection helper
-def get_db_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    return conn
+atexit.register(_close_conn)
 
 
 def detect_candidate_tables(conn):
     """
     Detect tables that look like they hold per-user collections.
-    Returns a list of dicts: {"table": name, "owner_col": colname}
+    Returns a list of dicts: {"table": name, "owner_col": colname, "update_sql": sql}
     """
     cur = conn.cursor()
-    tables = [r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    # reject by name before touching PRAGMA table_info (sqlite_* are internal: stat1, sequence...)
+    tables = [
+        r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        if r[0] not in EXCLUDE_TABLES and not r[0].startswith("sqlite_")
+    ]
 
     candidates = []
     for t in tables:
-        if t in EXCLUDE_TABLES:
-            continue
         try:
             cols = [r[1] for r in cur.execute(f"PRAGMA table_info('{t}')").fetchall()]
         except Exception:
             continue
 
-        # normalize lower-case
-        cols_l = [c.lower() for c in cols]
+        # normalize lower-case (lower -> original case, for the final column name)
+        lower_to_orig = {c.lower(): c for c in cols}
+        cols_set = lower_to_orig.keys()
 
-        # find ownership column
+        # find ownership column (first match in OWNERSHIP_COLS priority order)
         owner_col = None
-        for oc in OWNERSHIP_COLS:
-            if oc in cols_l:
-                # find original case-sensitive column name
-                owner_col = cols[cols_l.index(oc)]
-                break
-
-        # quick skip if no ownership column
-        if not owner_col:
-            # but if table name strongly matches known patterns, try to use 'user_id' if present
-            if t.lower() in ("user_cards", "user_waifus", "user_collections", "owned_waifus", "user_items"):
-                # try to use any column that looks like user id
-                for oc in OWNERSHIP_COLS:
-                    if oc in cols_l:
-                        owner_col = cols[cols_l.index(oc)]
-                        break
-
-        # find at least one item-like column
-        has_item_hint = False
-        for hint in ITEM_COL_HINTS:
-            if hint in cols_l:
-                has_item_hint = True
-                break
-
-        # accept if we have owner_col and item hint OR table name looks promising
-        if owner_col and (has_item_hint or t.lower() in ("user_cards", "user_waifus", "user_collections", "owned_waifus", "user_items")):
-            candidates.append({"table": t, "owner_col": owner_col})
+        hit = _OWNERSHIP_SET & cols_set
+        if hit:
+            owner_col = next(lower_to_orig[oc] for oc in OWNERSHIP_COLS if oc in hit)
+
+        # accept if we have owner_col and an item-like column OR table name looks promising
+        if owner_col and (t.lower() in _PROMISING_TABLE_NAMES or not _ITEM_HINTS_SET.isdisjoint(cols_set)):
+            candidates.append({
+                "table": t,
+                "owner_col": owner_col,
+                # built once per detection so every confirm passes the identical string
+                # and reuses the prepared statement from the connection's cache
+                "update_sql": f"UPDATE '{t}' SET {owner_col} = ? WHERE {owner_col} = ?",
+            })
 
     return candidates
 
 
+# Detection result cached until the schema changes (PRAGMA schema_version bumps on any DDL)
+_SCHEMA_CACHE = {"version": -1, "candidates": None}
+# (table, owner_col) pairs already given an index in this process
+_indexes_ensured = set()
+
+
+def _has_leading_index(conn, table, col):
+    """True if some index on table already starts with col (e.g. a (user_id, waifu_id) primary key)."""
+    for idx in conn.execute(f"PRAGMA index_list('{table}')").fetchall():
+        first = conn.execute(f"PRAGMA index_info('{idx[1]}')").fetchone()
+        if first and str(first[2]).lower() == col.lower():
+            return True
+    return False
+
+
+def ensure_owner_indexes(conn, candidates):
+    """
+    Index the owner column of each detected table once, so the transfer
+    COUNT/UPDATE ... WHERE owner = ? is a lookup instead of a full scan.
+    Best-effort: a table we can't index is just left as is.
+    """
+    for c in candidates:
+        key = (c["table"], c["owner_col"])
+        if key in _indexes_ensured:
+            continue
+        t, owner_col = key
+        try:
+            if not _has_leading_index(conn, t, owner_col):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS 'ix_{t}_{owner_col}' ON '{t}'({owner_col})")
+        except Exception as e:
+            print(f"❌ Could not index {t}.{owner_col}: {e}")
+        _indexes_ensured.add(key)
+
+
+def _cached_candidates(conn):
+    """detect_candidate_tables(), re-run only when PRAGMA schema_version has changed."""
+    v = conn.execute("PRAGMA schema_version").fetchone()[0]
+    if v != _SCHEMA_CACHE["version"]:
+        candidates = detect_candidate_tables(conn)
+        ensure_owner_indexes(conn, candidates)
+        # re-read: any index we just created bumped the version
+        v = conn.execute("PRAGMA schema_version").fetchone()[0]
+        _SCHEMA_CACHE.update(version=v, candidates=candidates)
+    return _SCHEMA_CACHE["candidates"]
+
+
+def count_owned_rows(cur, candidates, owner_value):
+    """
+    Per-candidate row counts for owner_value, in candidates order.
+    All tables are counted in one UNION ALL query; if that fails (e.g. a table
+    changed under us) fall back to counting table by table, 0 on error.
+    """
+    if not candidates:
+        return []
+    sql = " UNION ALL ".join(
+        f"SELECT {i}, COUNT(*) FROM '{c['table']}' WHERE {c['owner_col']} = ?"
+        for i, c in enumerate(candidates)
+    )
+    try:
+        counts = [0] * len(candidates)
+        for i, n in cur.execute(sql, (owner_value,) * len(candidates)).fetchall():
+            counts[i] = n
+        return counts
+    except Exception:
+        pass
+
+    counts = []
+    for c in candidates:
+        try:
+            cur.execute(f"SELECT COUNT(*) FROM '{c['table']}' WHERE {c['owner_col']} = ?", (owner_value,))
+            counts.append(cur.fetchone()[0])
+        except Exception:
+            counts.append(0)
+    return counts
+
+
+# ---------------- Blocking DB work (run via asyncio.to_thread, under _DB_LOCK) ----------------
+def _preview_transfer(from_uid):
+    """Returns (candidates, table names if nothing was detected, per-candidate row counts)."""
+    cur = _CONN.cursor()
+    candidates = _cached_candidates(_CONN)
+    tbls = []
+    if not candidates:
+        # give a helpful list of tables (so owner can tell which is correct)
+        tbls = [r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
+    return candidates, tbls, count_owned_rows(cur, candidates, from_uid)
+
+
+def _apply_transfer(from_uid, to_uid):
+    """
+    Move every candidate row from from_uid to to_uid inside one explicit transaction
+    (a single commit/fsync for all tables). Returns [(table, owner_col, moved or "error: ...")].
+    Rolls back and re-raises if the transaction itself fails.
+    """
+    cur = _CONN.cursor()
+    moved_summary = []
+    try:
+        candidates = _cached_candidates(_CONN)
+        cur.execute("BEGIN IMMEDIATE")
+        for c in candidates:
+            t = c["table"]
+            owner_col = c["owner_col"]
+            try:
+                # one statement per table: rowcount (sqlite changes()) is the number moved
+                cur.execute(c["update_sql"], (to_uid, from_uid))
+                if cur.rowcount > 0:
+                    moved_summary.append((t, owner_col, cur.rowcount))
+            except Exception as e:
+                # skip problematic table but collect info
+                moved_summary.append((t, owner_col, f"error: {e}"))
+
+        cur.execute("COMMIT")
+    except Exception:
+        if _CONN.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+    return moved_summary
+
+
 # helper to get owner id from config in a few possible attribute names
 def get_owner_id_from_config():
     for name in ("OWNER_ID", "OWNER", "OWNER_USER_ID", "OWNERID"):
@@ -94,6 +238,17 @@ def get_owner_id_from_config():
     return None
 
 
+# Resolved once at import; handlers compare against this directly
+_OWNER_ID = get_owner_id_from_config()
+
+
+def reload_owner():
+    """Re-read the owner id, for when Config is changed at runtime."""
+    global _OWNER_ID
+    _OWNER_ID = get_owner_id_from_config()
+    return _OWNER_ID
+
+
 # ---------------- /transfer command ----------------
 @app.on_message(filters.command("transfer"))
 async def transfer_command(client, message):
@@ -105,13 +260,12 @@ async def transfer_command(client, message):
     shows how many rows will be moved. Owner must confirm.
     """
     sender = message.from_user
-    owner_id = get_owner_id_from_config()
 
-    if owner_id is None:
+    if _OWNER_ID is None:
         await message.reply_text("❌ Owner ID not configured (Config.OWNER_ID missing). Transfer cancelled.")
         return
 
-    if sender.id != owner_id:
+    if sender.id != _OWNER_ID:
         await message.reply_text("❌ Only the bot owner can use this command.")
         return
 
@@ -131,40 +285,27 @@ async def transfer_command(client, message):
         await message.reply_text("❌ Source and destination IDs are the same. Nothing to do.")
         return
 
-    # open DB and detect candidate tables
-    conn = get_db_conn()
-    cur = conn.cursor()
+    # detect candidate tables and count what would move (off the event loop)
+    async with _DB_LOCK:
+        candidates, tbls, counts = await asyncio.to_thread(_preview_transfer, from_uid)
 
-    candidates = detect_candidate_tables(conn)
+    # Prepare a summary (counts per candidate)
+    summary_lines = []
+    total_rows = 0
+    for c, cnt in zip(candidates, counts):
+        summary_lines.append(f"• {c['table']}: {cnt} rows (owner column: {c['owner_col']})")
+        total_rows += cnt
 
     if not candidates:
-        # give a helpful list of tables (so owner can tell which is correct)
-        tbls = [r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
         await message.reply_text(
             "❌ Could not detect any collection tables automatically.\n"
             "Detected DB tables: \n" + ", ".join(tbls) + "\n\n"
             "If your collection table has a different name or schema, tell me the table name and column that stores the owner (e.g. user_id) and I can adjust the script."
         )
-        conn.close()
         return
 
-    # Prepare a summary (counts per candidate)
-    summary_lines = []
-    total_rows = 0
-    for c in candidates:
-        t = c["table"]
-        owner_col = c["owner_col"]
-        try:
-            cur.execute(f"SELECT COUNT(*) FROM '{t}' WHERE {owner_col} = ?", (from_uid,))
-            cnt = cur.fetchone()[0]
-        except Exception:
-            cnt = 0
-        summary_lines.append(f"• {t}: {cnt} rows (owner column: {owner_col})")
-        total_rows += cnt
-
     if total_rows == 0:
         await message.reply_text(f"⚠️ No collection rows found for user {from_uid} in detected tables. Nothing to transfer.")
-        conn.close()
         return
 
     # ask for confirmation
@@ -184,22 +325,23 @@ async def transfer_command(client, message):
         reply_markup=buttons
     )
 
-    conn.close()
 
+# ---------------- Callback handler ----------------
+@app.on_callback_query(filters.regex(_TRANSFER_CB_RE))
+async def transfer_cb(client, callback: CallbackQuery):
+    # filters.regex already matched the payload; reuse its captures
+    action, a, b = callback.matches[0].groups()
+    from_uid = int(a)
+    to_uid = int(b)
+
+    if action == "cancel":
+        await transfer_cancel_cb(callback, from_uid, to_uid)
+    else:
+        await transfer_confirm_cb(callback, from_uid, to_uid)
 
-# ---------------- Callback handlers ----------------
-@app.on_callback_query(filters.regex(r"^transfer_cancel:(\d+):(\d+)$"))
-async def transfer_cancel_cb(client, callback: CallbackQuery):
-    data = callback.data or ""
-    m = re.match(r"^transfer_cancel:(\d+):(\d+)$", data)
-    if not m:
-        await callback.answer("Invalid data.")
-        return
-    from_uid = int(m.group(1))
-    to_uid = int(m.group(2))
 
-    owner_id = get_owner_id_from_config()
-    if callback.from_user.id != owner_id:
+async def transfer_cancel_cb(callback: CallbackQuery, from_uid, to_uid):
+    if callback.from_user.id != _OWNER_ID:
         await callback.answer("Only owner can cancel.", show_alert=True)
         return
 
@@ -210,49 +352,21 @@ async def transfer_cancel_cb(client, callback: CallbackQuery):
     await callback.answer("Cancelled.")
 
 
-@app.on_callback_query(filters.regex(r"^transfer_confirm:(\d+):(\d+)$"))
-async def transfer_confirm_cb(client, callback: CallbackQuery):
-    data = callback.data or ""
-    m = re.match(r"^transfer_confirm:(\d+):(\d+)$", data)
-    if not m:
-        await callback.answer("Invalid data.")
-        return
-    from_uid = int(m.group(1))
-    to_uid = int(m.group(2))
-
-    owner_id = get_owner_id_from_config()
-    if callback.from_user.id != owner_id:
+async def transfer_confirm_cb(callback: CallbackQuery, from_uid, to_uid):
+    if callback.from_user.id != _OWNER_ID:
         await callback.answer("Only owner can confirm.", show_alert=True)
         return
 
-    conn = get_db_conn()
-    cur = conn.cursor()
-
-    candidates = detect_candidate_tables(conn)
-
-    # perform updates inside a transaction
-    moved_summary = []
-    try:
-        for c in candidates:
-            t = c["table"]
-            owner_col = c["owner_col"]
-            try:
-                # count first
-                cur.execute(f"SELECT COUNT(*) FROM '{t}' WHERE {owner_col} = ?", (from_uid,))
-                cnt_before = cur.fetchone()[0]
-
-                if cnt_before > 0:
-                    cur.execute(f"UPDATE '{t}' SET {owner_col} = ? WHERE {owner_col} = ?", (to_uid, from_uid))
-                    moved_summary.append((t, owner_col, cnt_before))
-            except Exception as e:
-                # skip problematic table but collect info
-                moved_summary.append((t, owner_col, f"error: {e}"))
+    # perform updates off the event loop; a long UPDATE must not stall other handlers
+    error = None
+    async with _DB_LOCK:
+        try:
+            moved_summary = await asyncio.to_thread(_apply_transfer, from_uid, to_uid)
+        except Exception as e:
+            error = e
 
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        await callback.message.edit_text(f"❌ Transfer failed: {e}")
-        conn.close()
+    if error is not None:
+        await callback.message.edit_text(f"❌ Transfer failed: {error}")
         await callback.answer("Transfer failed.", show_alert=True)
         return
 
@@ -266,5 +380,4 @@ async def transfer_confirm_cb(client, callback: CallbackQuery):
     except Exception:
         pass
 
-    conn.close()
     await callback.answer("Transfer completed.")
@@ -19,8 +19,11 @@ Notes / privacy:
  - This file *only* adds the contact-storage handler and the owner /details command.
 """
 
+import asyncio
+import atexit
 import sqlite3
 import io
+from collections import defaultdict
 from datetime import datetime
 
 from pyrogram import filters
@@ -28,8 +31,12 @@ from pyrogram.types import Message, Contact
 from config import app, Config
 
 DB_PATH = "waifu_bot.db"
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
 cursor = conn.cursor()
+# WAL + NORMAL sync: contact saves don't fsync per commit or block readers
+cursor.execute("PRAGMA journal_mode=WAL")
+cursor.execute("PRAGMA synchronous=NORMAL")
+cursor.execute("PRAGMA wal_autocheckpoint=1000")
 
 # Ensure contacts table exists (stores contacts users explicitly shared with bot)
 cursor.execute("""
@@ -43,6 +50,84 @@ CREATE TABLE IF NOT EXISTS user_contacts (
 """)
 conn.commit()
 
+# Kept as constants so every call passes the identical string and hits the
+# connection's prepared-statement cache.
+_SEL_CONTACT = "SELECT phone, name FROM user_contacts WHERE user_id = ?"
+_UPSERT_CONTACT = """
+    INSERT OR REPLACE INTO user_contacts (user_id, phone, name, saved_by, saved_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+# ------------------ Batched contact writes ------------------
+# Shared contacts are buffered for a moment and written in one transaction, so a burst
+# of shares costs one commit instead of one per message.
+CONTACT_FLUSH_SECS = 0.1
+CONTACT_FLUSH_MAX = 50
+_PENDING_CONTACTS = {}  # {user_id: (user_id, phone, name, saved_by, saved_at)}
+_contact_flush_task = None
+_contact_tick = None  # future resolved when the currently pending contacts are committed
+_early_flushes = set()  # strong refs to size-triggered flush tasks
+
+
+def write_contacts(batch):
+    conn.executemany(_UPSERT_CONTACT, batch)
+    conn.commit()
+
+
+def _fetch_contact(user_id):
+    # conn.execute: own cursor, safe from the worker thread
+    return conn.execute(_SEL_CONTACT, (user_id,)).fetchone()
+
+
+async def _flush_contacts():
+    global _contact_tick
+    if not _PENDING_CONTACTS:
+        return
+    batch = list(_PENDING_CONTACTS.values())
+    _PENDING_CONTACTS.clear()
+    tick, _contact_tick = _contact_tick, None
+    try:
+        await asyncio.to_thread(write_contacts, batch)
+    except Exception as e:
+        print(f"❌ Failed to save contacts: {e}")
+        tick.set_exception(e)
+    else:
+        tick.set_result(None)
+
+
+async def _contact_flush_loop():
+    # runs only while contacts are pending; queue_contact restarts it
+    while _PENDING_CONTACTS:
+        await asyncio.sleep(CONTACT_FLUSH_SECS)
+        await _flush_contacts()
+
+
+def queue_contact(user_id, phone, name, saved_by, saved_at):
+    """Queue a contact write; returns a future that resolves once it is committed."""
+    global _contact_flush_task, _contact_tick
+    _PENDING_CONTACTS[user_id] = (user_id, phone, name, saved_by, saved_at)
+    if _contact_tick is None:
+        _contact_tick = asyncio.get_running_loop().create_future()
+    tick = _contact_tick
+    if _contact_flush_task is None or _contact_flush_task.done():
+        _contact_flush_task = asyncio.create_task(_contact_flush_loop())
+    if len(_PENDING_CONTACTS) >= CONTACT_FLUSH_MAX and not _early_flushes:
+        task = asyncio.create_task(_flush_contacts())
+        _early_flushes.add(task)
+        task.add_done_callback(_early_flushes.discard)
+    return tick
+
+
+@atexit.register
+def _flush_contacts_at_exit():
+    # whatever is still buffered when the process stops (its senders were never answered)
+    if _PENDING_CONTACTS:
+        try:
+            write_contacts(list(_PENDING_CONTACTS.values()))
+        except Exception as e:
+            print(f"❌ Failed to save contacts at exit: {e}")
+
 
 # ------------------ Helper: save contact when a user shares contact in private ------------------
 # This handler stores contacts shared in private chats (best-effort).
@@ -58,17 +143,19 @@ async def store_shared_contact(client, message: Message):
         # contact.user_id may be None if phone-only contact; prefer contact.user_id when available.
         target_id = contact.user_id if contact.user_id else None
         phone = contact.phone_number
-        name = " ".join(filter(None, [contact.first_name, contact.last_name])).strip() or contact.vcard or "Unknown"
+        fn, ln = contact.first_name, contact.last_name
+        name = f"{fn} {ln}" if (fn and ln) else (fn or ln or contact.vcard or "Unknown")
         saved_by = message.from_user.id if message.from_user else None
         saved_at = datetime.utcnow().isoformat()
 
         if target_id:
             # store by explicit user id
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_contacts (user_id, phone, name, saved_by, saved_at)
-                VALUES (?, ?, ?, ?, ?)
-            """, (int(target_id), phone, name, saved_by, saved_at))
-            conn.commit()
+            saved = queue_contact(int(target_id), phone, name, saved_by, saved_at)
+            try:
+                await saved  # only confirm once the batch holding it is committed
+            except Exception:
+                await message.reply_text("❌ Could not save the contact right now. Please share it again later.")
+                return
             await message.reply_text("✅ Contact saved. Owner can view this via /details.")
         else:
             # No linked Telegram user id — we still store a placeholder using negative row id (timestamp)
@@ -83,6 +170,43 @@ async def store_shared_contact(client, message: Message):
 
 
 # ------------------ /details command (owner-only) ------------------
+# Static scaffolding of the /details report, filled with str.format_map
+_DETAILS_HEAD = (
+    "User details report generated: {ts} UTC\n"
+    + "=" * 60 + "\n"
+    "Requested ID: {uid}\n"
+    "\n"
+)
+_DETAILS_USER = (
+    "First name: {first}\n"
+    "Last name: {last}\n"
+    "Username: @{username}\n"
+    "Is bot: {is_bot}\n"
+    "Language code: {lang}\n"
+)
+_DETAILS_NO_USER = "Telegram API: Could not fetch user via get_users (may be privacy/invalid id).\n"
+_DETAILS_PHOTOS = "Profile photos (count): {photos}\n"
+_DETAILS_STATUS = "Status in this chat: {status}\n"
+_DETAILS_PHONE = (
+    "Phone (from user-shared contact):\n"
+    " - Number: {phone}\n"
+    " - Saved name: {contact_name}\n"
+    "\n"
+)
+_DETAILS_NO_PHONE = (
+    "Phone: Not available.\n"
+    "Note: Telegram bots cannot fetch other users' phone numbers via the API.\n"
+    "If you want to collect phone numbers for verification, instruct users to send their contact to the bot in private (Attach → Contact).\n"
+    "When a user shares their contact in private with the bot, it will be stored and visible here.\n"
+    "\n"
+)
+_DETAILS_SUGGESTIONS = (
+    "Suggestions to gather phone numbers reliably:\n"
+    "- Ask users to DM the bot and share their contact via Telegram's contact share (this bot stores those contacts).\n"
+    "- Require a verification step that asks users to confirm a code sent to their phone (external SMS) — requires additional infra.\n"
+)
+
+
 @app.on_message(filters.command("details"))
 async def details_handler(client, message: Message):
     """
@@ -110,93 +234,79 @@ async def details_handler(client, message: Message):
         await message.reply_text("❌ Invalid user id. It must be a numeric Telegram user id.")
         return
 
-    # Try to fetch user via Telegram API (best-effort)
-    user_info = None
-    profile_photo_count = None
-    chat_member_status = None
+    # Telegram lookups are independent round-trips: run them concurrently (best-effort each).
+    # get_chat_member only if the command was invoked from a group; enumerating the bot's
+    # groups for mutual membership would be too costly.
+    calls = [client.get_users(target_id), client.get_chat_photos_count(target_id)]
+    in_group = False
     try:
-        user_info = await client.get_users(target_id)
-    except Exception as e:
-        # user_info stays None if user not found or privacy prevents retrieval
-        user_info = None
-        # we continue to collect what we can (contacts etc.)
-
-    try:
-        photos = await client.get_user_profile_photos(target_id)
-        profile_photo_count = photos.total_count if photos else 0
+        in_group = bool(message.chat and message.chat.type in ("group", "supergroup"))
     except Exception:
-        profile_photo_count = None
+        pass
+    if in_group:
+        calls.append(client.get_chat_member(message.chat.id, target_id))
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    # user_info stays None if user not found or privacy prevents retrieval;
+    # we continue to collect what we can (contacts etc.)
+    user_info = None if isinstance(results[0], Exception) else results[0]
+
+    profile_photo_count = None if isinstance(results[1], Exception) else results[1]
+
+    chat_member_status = None
+    if in_group and not isinstance(results[2], Exception):
+        chat_member_status = getattr(results[2], "status", None)
 
     # Check if we have a saved contact phone number for this user
     phone = None
     contact_name = None
     try:
-        cursor.execute("SELECT phone, name FROM user_contacts WHERE user_id = ?", (target_id,))
-        r = cursor.fetchone()
+        pending = _PENDING_CONTACTS.get(target_id)  # shared moments ago, not flushed yet
+        if pending:
+            r = (pending[1], pending[2])
+        else:
+            r = await asyncio.to_thread(_fetch_contact, target_id)
         if r:
             phone, contact_name = r[0], r[1]
     except Exception:
         phone = None
 
-    # Attempt to get chat member status for any mutual groups where the bot is present is costly;
-    # we won't enumerate groups here to avoid heavy ops. Instead attempt a single get_chat_member
-    # only if the command was invoked from a group and target is part of that chat.
-    try:
-        if message.chat and message.chat.type in ("group", "supergroup"):
-            try:
-                cm = await client.get_chat_member(message.chat.id, target_id)
-                chat_member_status = cm.status
-            except Exception:
-                chat_member_status = None
-    except Exception:
-        chat_member_status = None
-
-    # Build report
-    lines = []
-    lines.append(f"User details report generated: {datetime.utcnow().isoformat()} UTC")
-    lines.append("=" * 60)
-    lines.append(f"Requested ID: {target_id}")
-    lines.append("")
-
+    # Build report: static sections are module templates, only the fields are computed.
+    # Missing/empty fields render as "—".
+    fields = defaultdict(lambda: "—")
+    fields["ts"] = datetime.utcnow().isoformat()
+    fields["uid"] = target_id
+    fields["photos"] = profile_photo_count if profile_photo_count is not None else "unknown"
     if user_info:
-        lines.append(f"First name: {getattr(user_info, 'first_name', '') or '—'}")
-        lines.append(f"Last name: {getattr(user_info, 'last_name', '') or '—'}")
-        lines.append(f"Username: @{getattr(user_info, 'username', '') if getattr(user_info, 'username', None) else '—'}")
-        lines.append(f"Is bot: {getattr(user_info, 'is_bot', False)}")
-        lines.append(f"Language code: {getattr(user_info, 'language_code', None) or '—'}")
-        # Some attributes may be missing for bots
         # user_info.status is not available via get_users; presence / last seen cannot be reliably obtained here.
-    else:
-        lines.append("Telegram API: Could not fetch user via get_users (may be privacy/invalid id).")
-
-    lines.append(f"Profile photos (count): {profile_photo_count if profile_photo_count is not None else 'unknown'}")
+        for key, attr in (("first", "first_name"), ("last", "last_name"), ("username", "username"), ("lang", "language_code")):
+            val = getattr(user_info, attr, None)
+            if val:
+                fields[key] = val
+        fields["is_bot"] = getattr(user_info, "is_bot", False)
     if chat_member_status:
-        lines.append(f"Status in this chat: {chat_member_status}")
-    lines.append("")
-
-    # Phone info from stored contacts (explicit user-shared contacts)
+        fields["status"] = chat_member_status
     if phone:
-        lines.append("Phone (from user-shared contact):")
-        lines.append(f" - Number: {phone}")
-        lines.append(f" - Saved name: {contact_name or '—'}")
-        lines.append("")
-    else:
-        lines.append("Phone: Not available.")
-        lines.append("Note: Telegram bots cannot fetch other users' phone numbers via the API.")
-        lines.append("If you want to collect phone numbers for verification, instruct users to send their contact to the bot in private (Attach → Contact).")
-        lines.append("When a user shares their contact in private with the bot, it will be stored and visible here.")
-        lines.append("")
-
-    # Extra suggestions
-    lines.append("Suggestions to gather phone numbers reliably:")
-    lines.append("- Ask users to DM the bot and share their contact via Telegram's contact share (this bot stores those contacts).")
-    lines.append("- Require a verification step that asks users to confirm a code sent to their phone (external SMS) — requires additional infra.")
-    lines.append("")
-
-    report_text = "\n".join(lines)
-
-    # Create in-memory text file and send to owner (who invoked)
-    bio = io.BytesIO(report_text.encode("utf-8"))
+        fields["phone"] = phone
+        if contact_name:
+            fields["contact_name"] = contact_name
+
+    sections = (
+        _DETAILS_HEAD,
+        _DETAILS_USER if user_info else _DETAILS_NO_USER,
+        _DETAILS_PHOTOS,
+        _DETAILS_STATUS if chat_member_status else "",
+        "\n",
+        _DETAILS_PHONE if phone else _DETAILS_NO_PHONE,
+        _DETAILS_SUGGESTIONS,
+    )
+
+    # Create in-memory text file and send to owner (who invoked).
+    # Encode section by section straight into the buffer: no joined str / encoded bytes copies.
+    bio = io.BytesIO()
+    for section in sections:
+        bio.write(section.format_map(fields).encode("utf-8"))
+    bio.seek(0)
     bio.name = f"user_details_{target_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.txt"
 
     try:
@@ -1,21 +1,20 @@
 import importlib
-import os
+import pkgutil
 from dotenv import load_dotenv
 from config import app
+import handlers
 
 # load environment variables from .env
 load_dotenv()
 
 def load_handlers():
-    handlers_dir = "handlers"
-    for filename in os.listdir(handlers_dir):
-        if filename.endswith(".py"):
-            module_name = f"{handlers_dir}.{filename[:-3]}"
-            try:
-                importlib.import_module(module_name)
-                print(f"✅ Loaded: {filename}")
-            except Exception as e:
-                print(f"❌ Failed to load {filename}: {e}")
+    # iter_modules yields importable module names only (no __pycache__, no suffix checks)
+    for m in pkgutil.iter_modules(handlers.__path__):
+        try:
+            importlib.import_module(f"handlers.{m.name}")
+            print(f"✅ Loaded: {m.name}.py")
+        except Exception as e:
+            print(f"❌ Failed to load {m.name}.py: {e}")
 
 if __name__ == "__main__":
     load_handlers()